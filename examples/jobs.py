@@ -1,18 +1,28 @@
 """Modello examples based on jobs."""
 from functools import lru_cache
+from types import MappingProxyType
 
 from modello import InstanceDummy, Modello
-from sympy import Function, Heaviside, Piecewise, Rational, S, Symbol, oo
+from sympy import Add, Function, Piecewise, Rational, S, Symbol, lambdify, oo
+from sympy.printing.pycode import SymPyPrinter
 
 YEAR = 2023
+# the argument of every generated function, so brackets tuples are the only cache key
+GROSS_INCOME = Symbol("gross_income", rational=True, positive=True)
 
+# monthly national insurance thresholds, as yearly amounts
+PRIMARY_THRESHOLD_2018 = 702 * 12
+UPPER_EARNINGS_LIMIT_2018 = 3863 * 12
+PRIMARY_THRESHOLD_2019 = 719 * 12
+UPPER_EARNINGS_LIMIT_2019 = 4167 * 12
+PRIMARY_THRESHOLD_2023 = 1048 * 12
+UPPER_EARNINGS_LIMIT_2023 = 4189 * 12
 
-def generate_piecewise_income_tax(year=YEAR):
-    """Assuming band A."""
-    # 2019-2020 UK tax brackets
-    # XXX: this omits the income limit for personal allowance. A fix for this could be to add a
-    #  bracket from £100,000 to £125,000 (for 2019)
-    year_band_brackets = {
+# 2019-2020 UK tax brackets
+# XXX: this omits the income limit for personal allowance. A fix for this could be to add a
+#  bracket from £100,000 to £125,000 (for 2019)
+INCOME_TAX_TABLE = MappingProxyType(
+    {
         2018: (
             (-oo, 0),
             (11850, Rational(1, 5)),
@@ -37,125 +47,147 @@ def generate_piecewise_income_tax(year=YEAR):
             (125_140, Rational(9, 20)),
         ),
     }
-    return generate_piecewise_function(year_band_brackets[year])
+)
+
+# brackets shared between bands, so each is only built once
+NI_STANDARD_2018 = (
+    (-oo, 0),
+    (PRIMARY_THRESHOLD_2018, Rational(12, 100)),
+    (UPPER_EARNINGS_LIMIT_2018, Rational(2, 100)),
+)
+NI_DEFERRED_2018 = ((-oo, 0), (PRIMARY_THRESHOLD_2018, Rational(2, 100)))
+EMPLOYER_NI_2018 = ((-oo, 0), (PRIMARY_THRESHOLD_2018, Rational(138, 1000)))
+EMPLOYER_NI_RELIEF_2018 = ((-oo, 0), (UPPER_EARNINGS_LIMIT_2018, Rational(138, 1000)))
+
+NI_STANDARD_2019 = (
+    (-oo, 0),
+    (PRIMARY_THRESHOLD_2019, Rational(12, 100)),
+    (UPPER_EARNINGS_LIMIT_2019, Rational(2, 100)),
+)
+NI_DEFERRED_2019 = ((-oo, 0), (PRIMARY_THRESHOLD_2019, Rational(2, 100)))
+EMPLOYER_NI_2019 = ((-oo, 0), (PRIMARY_THRESHOLD_2019, Rational(138, 1000)))
+EMPLOYER_NI_RELIEF_2019 = ((-oo, 0), (UPPER_EARNINGS_LIMIT_2019, Rational(138, 1000)))
+
+NI_STANDARD_2023 = (
+    (-oo, 0),
+    (PRIMARY_THRESHOLD_2023, Rational(12, 100)),
+    (UPPER_EARNINGS_LIMIT_2023, Rational(2, 100)),
+)
+NI_DEFERRED_2023 = ((-oo, 0), (PRIMARY_THRESHOLD_2023, Rational(2, 100)))
+EMPLOYER_NI_2023 = ((-oo, 0), (PRIMARY_THRESHOLD_2023, Rational(138, 1000)))
+EMPLOYER_NI_RELIEF_2023 = ((-oo, 0), (UPPER_EARNINGS_LIMIT_2023, Rational(138, 1000)))
+
+# UK employee NI brackets by tax year (2018, 2019 and 2023) and NI category letter
+NATIONAL_INSURANCE_TABLE = MappingProxyType(
+    {
+        2018: MappingProxyType(
+            {
+                "A": NI_STANDARD_2018,
+                "B": (
+                    (-oo, 0),
+                    (PRIMARY_THRESHOLD_2018, Rational(585, 100)),
+                    (UPPER_EARNINGS_LIMIT_2018, Rational(2, 100)),
+                ),
+                "C": ((-oo, 0),),
+                "H": NI_STANDARD_2018,
+                "J": NI_DEFERRED_2018,
+                "M": NI_STANDARD_2018,
+                "Z": NI_DEFERRED_2018,
+            }
+        ),
+        2019: MappingProxyType(
+            {
+                "A": NI_STANDARD_2019,
+                "B": (
+                    (-oo, 0),
+                    (219 * 12, Rational(585, 100)),
+                    (UPPER_EARNINGS_LIMIT_2019, Rational(2, 100)),
+                ),
+                "C": ((-oo, 0),),
+                "H": NI_STANDARD_2019,
+                "J": NI_DEFERRED_2019,
+                "M": NI_STANDARD_2019,
+                "Z": NI_DEFERRED_2019,
+            }
+        ),
+        2023: MappingProxyType(
+            {
+                "A": NI_STANDARD_2023,
+                "B": (
+                    (-oo, 0),
+                    (PRIMARY_THRESHOLD_2023, Rational(585, 100)),
+                    (UPPER_EARNINGS_LIMIT_2023, Rational(2, 100)),
+                ),
+                "C": ((-oo, 0),),
+                "H": NI_STANDARD_2023,
+                "J": NI_DEFERRED_2023,
+                "M": NI_STANDARD_2023,
+                "Z": NI_DEFERRED_2023,
+            }
+        ),
+    }
+)
+
+# UK employer NI brackets by tax year (2018, 2019 and 2023) and NI category letter
+EMPLOYER_NATIONAL_INSURANCE_TABLE = MappingProxyType(
+    {
+        2018: MappingProxyType(
+            {
+                "A": EMPLOYER_NI_2018,
+                "B": EMPLOYER_NI_2018,
+                "C": EMPLOYER_NI_2018,
+                "H": EMPLOYER_NI_RELIEF_2018,
+                "J": EMPLOYER_NI_2018,
+                "M": EMPLOYER_NI_RELIEF_2018,
+                "Z": EMPLOYER_NI_RELIEF_2018,
+            }
+        ),
+        2019: MappingProxyType(
+            {
+                "A": EMPLOYER_NI_2019,
+                "B": EMPLOYER_NI_2019,
+                "C": EMPLOYER_NI_2019,
+                "H": EMPLOYER_NI_RELIEF_2019,
+                "J": EMPLOYER_NI_2019,
+                "M": EMPLOYER_NI_RELIEF_2019,
+                "Z": EMPLOYER_NI_RELIEF_2019,
+            }
+        ),
+        2023: MappingProxyType(
+            {
+                "A": EMPLOYER_NI_2023,
+                "B": EMPLOYER_NI_2023,
+                "C": EMPLOYER_NI_2023,
+                "H": EMPLOYER_NI_RELIEF_2023,
+                "J": EMPLOYER_NI_2023,
+                "M": EMPLOYER_NI_RELIEF_2023,
+                "Z": EMPLOYER_NI_RELIEF_2023,
+            }
+        ),
+    }
+)
+
+
+def generate_piecewise_income_tax(year=YEAR):
+    """Assuming band A."""
+    return generate_piecewise_function(INCOME_TAX_TABLE[year])
 
 
 def generate_piecewise_national_insurance(year=YEAR, band="A"):
     """Assuming band A."""
-    # 2018-2019 UK band A NI
-    year_band_brackets = {
-        2018: {
-            "A": (
-                (-oo, 0),
-                (702 * 12, Rational(12, 100)),
-                (3863 * 12, Rational(2, 100)),
-            ),
-            "B": (
-                (-oo, 0),
-                (702 * 12, Rational(585, 100)),
-                (3863 * 12, Rational(2, 100)),
-            ),
-            "C": ((-oo, 0),),
-            "H": (
-                (-oo, 0),
-                (702 * 12, Rational(12, 100)),
-                (3863 * 12, Rational(2, 100)),
-            ),
-            "J": ((-oo, 0), (702 * 12, Rational(2, 100))),
-            "M": (
-                (-oo, 0),
-                (702 * 12, Rational(12, 100)),
-                (3863 * 12, Rational(2, 100)),
-            ),
-            "Z": ((-oo, 0), (702 * 12, Rational(2, 100))),
-        },
-        2019: {
-            "A": (
-                (-oo, 0),
-                (719 * 12, Rational(12, 100)),
-                (4167 * 12, Rational(2, 100)),
-            ),
-            "B": (
-                (-oo, 0),
-                (219 * 12, Rational(585, 100)),
-                (4167 * 12, Rational(2, 100)),
-            ),
-            "C": ((-oo, 0),),
-            "H": (
-                (-oo, 0),
-                (719 * 12, Rational(12, 100)),
-                (4167 * 12, Rational(2, 100)),
-            ),
-            "J": ((-oo, 0), (719 * 12, Rational(2, 100))),
-            "M": (
-                (-oo, 0),
-                (719 * 12, Rational(12, 100)),
-                (4167 * 12, Rational(2, 100)),
-            ),
-            "Z": ((-oo, 0), (719 * 12, Rational(2, 100))),
-        },
-        2023: {
-            "A": (
-                (-oo, 0),
-                (1048 * 12, Rational(12, 100)),
-                (4189 * 12, Rational(2, 100)),
-            ),
-            "B": (
-                (-oo, 0),
-                (1048 * 12, Rational(585, 100)),
-                (4189 * 12, Rational(2, 100)),
-            ),
-            "C": ((-oo, 0),),
-            "H": (
-                (-oo, 0),
-                (1048 * 12, Rational(12, 100)),
-                (4189 * 12, Rational(2, 100)),
-            ),
-            "J": ((-oo, 0), (1048 * 12, Rational(2, 100))),
-            "M": (
-                (-oo, 0),
-                (1048 * 12, Rational(12, 100)),
-                (4189 * 12, Rational(2, 100)),
-            ),
-            "Z": ((-oo, 0), (1048 * 12, Rational(2, 100))),
-        },
-    }
-    return generate_piecewise_function(year_band_brackets[year][band])
+    return generate_piecewise_function(NATIONAL_INSURANCE_TABLE[year][band])
 
 
 def generate_piecewise_employer_national_insurance(year=YEAR, band="A"):
     """Assuming band A."""
-    # 2018-2019 UK band A NI
-    year_band_brackets = {
-        2018: {
-            "A": ((-oo, 0), (702 * 12, Rational(138, 1000))),
-            "B": ((-oo, 0), (702 * 12, Rational(138, 1000))),
-            "C": ((-oo, 0), (702 * 12, Rational(138, 1000))),
-            "H": ((-oo, 0), (3863 * 12, Rational(138, 1000))),
-            "J": ((-oo, 0), (702 * 12, Rational(138, 1000))),
-            "M": ((-oo, 0), (3863 * 12, Rational(138, 1000))),
-            "Z": ((-oo, 0), (3863 * 12, Rational(138, 1000))),
-        },
-        2019: {
-            "A": ((-oo, 0), (719 * 12, Rational(138, 1000))),
-            "B": ((-oo, 0), (719 * 12, Rational(138, 1000))),
-            "C": ((-oo, 0), (719 * 12, Rational(138, 1000))),
-            "H": ((-oo, 0), (4167 * 12, Rational(138, 1000))),
-            "J": ((-oo, 0), (719 * 12, Rational(138, 1000))),
-            "M": ((-oo, 0), (4167 * 12, Rational(138, 1000))),
-            "Z": ((-oo, 0), (4167 * 12, Rational(138, 1000))),
-        },
-        2023: {
-            "A": ((-oo, 0), (1048 * 12, Rational(138, 1000))),
-            "B": ((-oo, 0), (1048 * 12, Rational(138, 1000))),
-            "C": ((-oo, 0), (1048 * 12, Rational(138, 1000))),
-            "H": ((-oo, 0), (4189 * 12, Rational(138, 1000))),
-            "J": ((-oo, 0), (1048 * 12, Rational(138, 1000))),
-            "M": ((-oo, 0), (4189 * 12, Rational(138, 1000))),
-            "Z": ((-oo, 0), (4189 * 12, Rational(138, 1000))),
-        },
-    }
-    return generate_piecewise_function(year_band_brackets[year][band])
+    return generate_piecewise_function(EMPLOYER_NATIONAL_INSURANCE_TABLE[year][band])
+
+
+class ExactPrinter(SymPyPrinter):
+    """Printer for lambdify which keeps rational constants exact rather than using float division."""
+
+    def _print_Rational(self, expr):
+        return "Rational(%d, %d)" % (expr.p, expr.q)
 
 
 @lru_cache(maxsize=None)
@@ -176,21 +208,79 @@ def generate_piecewise_function(brackets):
     >>> from sympy import solve, Eq
     >>> solve(Eq(f(x), 1))
     [20]
+    >>> f(x)
+    Piecewise((0, x < 10), (x/10 - 1, x < 20), (x/5 - 3, True))
     """
-    gross = Symbol("gross_income", rational=True, positive=True)
+    if len(brackets) <= 1:
+        # only the base rate applies, so there is never any tax due
+
+        class F(Function):
+            float_function = staticmethod(lambda gross_income: 0.0)
+
+            @classmethod
+            def eval(cls, gross_income):
+                return S.Zero
+
+        return F
+
+    gross = GROSS_INCOME
+    # order by threshold so the pieces form a single ascending chain of gross < limit tests
+    brackets = sorted(brackets, key=lambda bracket: bracket[0])
     # Personal Allowance, Basic Rate, Higher Rate, Additional Rate
-    result = S.Zero
-    for i, (limit, tax) in enumerate(brackets[1:]):
-        # add the increase in tax for each limit
-        result += Heaviside(gross - limit, 0) * (tax - brackets[i][1]) * (gross - limit)
-    # Solvers aren't implemented for the Heaviside function, so convert to piecewise
+    # the first bracket's rate is the base rate, tax is only charged on the increase above it
+    base_tax = brackets[0][1]
+    pieces = [(S.Zero, gross < brackets[1][0])]
+    # tax due up to the start of each bracket
+    cumulative = S.Zero
+    for i, (limit, tax) in enumerate(brackets[1:], 1):
+        condition = gross < brackets[i + 1][0] if i + 1 < len(brackets) else True
+        pieces.append((cumulative + (tax - base_tax) * (gross - limit), condition))
+        if i + 1 < len(brackets):
+            cumulative += (tax - base_tax) * (brackets[i + 1][0] - limit)
     # FIXME: apply appropriate constraints. If gross_income is positive the expression is positive
-    piecewise = result.rewrite(Piecewise)
+    piecewise = Piecewise(*pieces)
+    return generate_function(piecewise)
+
+
+@lru_cache(maxsize=None)
+def generate_combined_tax(year=YEAR, band="A"):
+    """Generate the deductions made from a salary, combined so they are evaluated together.
+
+    >>> f = generate_combined_tax(2019)
+    >>> f(40_000) == generate_piecewise_income_tax(2019)(40_000) + generate_piecewise_national_insurance(2019)(40_000)
+    True
+    """
+    return generate_combined_function(
+        generate_piecewise_income_tax(year),
+        generate_piecewise_national_insurance(year, band),
+    )
+
+
+def generate_combined_function(*functions):
+    """Generate a function which is the sum of the given functions of gross income.
+
+    >>> f = generate_combined_function(IncomeTaxFunction, NationalInsuranceFunction)
+    >>> f(40_000) == IncomeTaxFunction(40_000) + NationalInsuranceFunction(40_000)
+    True
+    """
+    return generate_function(Add(*(function(GROSS_INCOME) for function in functions)))
+
+
+def generate_function(expression):
+    """Generate a function of gross income from an expression in terms of GROSS_INCOME."""
+    # compiled once so numeric evaluation avoids walking the expression tree
+    numeric_fn = lambdify((GROSS_INCOME,), expression, modules=[{"Rational": Rational}], printer=ExactPrinter, cse=True)
 
     class F(Function):
+        # for callers which only need a float and not an exact value
+        float_function = staticmethod(lambdify((GROSS_INCOME,), expression, modules="math", cse=True))
+
         @classmethod
         def eval(cls, gross_income):
-            return piecewise.replace(gross, gross_income)
+            # repeat calls are answered by sympy's cache of Function construction without reaching here
+            if gross_income.is_Number:
+                return S(numeric_fn(gross_income))
+            return expression.xreplace({GROSS_INCOME: gross_income})
 
     return F
 
@@ -198,6 +288,7 @@ def generate_piecewise_function(brackets):
 IncomeTaxFunction = generate_piecewise_income_tax()
 NationalInsuranceFunction = generate_piecewise_national_insurance()
 EmployerNationalInsuranceFunction = generate_piecewise_employer_national_insurance()
+DeductionsFunction = generate_combined_tax()
 
 
 class Job(Modello):
@@ -216,15 +307,29 @@ class Job(Modello):
     salary = InstanceDummy("salery", rational=True, positive=True)
     hours = InstanceDummy("hours", rational=True, positive=True)
     expenses = InstanceDummy("expenses")
-    income = (
-            salary
-            - IncomeTaxFunction(salary)
-            - NationalInsuranceFunction(salary)
-            - expenses
-    )
+    income = salary - DeductionsFunction(salary) - expenses
     hourly_income = income / hours
     employer_expense = salary + EmployerNationalInsuranceFunction(salary)
 
+    @staticmethod
+    def float_hourly_income(salary, hours, expenses):
+        """Return the hourly income as a float, without solving a model.
+
+        >>> round(Job.float_hourly_income(32000, 253*8, 0), 2)
+        12.74
+        """
+        return (salary - DeductionsFunction.float_function(salary) - expenses) / hours
+
+    @staticmethod
+    def float_incomes(salaries, expenses=0):
+        """Return the income for each of many salaries as floats, without solving a model per salary.
+
+        >>> [round(income) for income in Job.float_incomes([20_000, 40_000])]
+        [17623, 31223]
+        """
+        deductions = DeductionsFunction.float_function
+        return [salary - deductions(salary) - expenses for salary in salaries]
+
 
 def test_job():
     """The job model can be used to work out what salary is needed to factor out expenses."""
@@ -1,6 +1,6 @@
 """Symbolic models for a system which contains units which have inputs and outputs."""
 from modello import InstanceDummy, Modello
-from sympy import Rational, ceiling
+from sympy import Add, Rational, ceiling
 
 
 class ScalableFlow(Modello):
@@ -59,6 +59,16 @@ class DoubleDataEntryFlow(ScalableFlow):
     unit_output = Rational(8 * 260, 24 * 365) / entry_time / 2
 
 
+def total_cost(flows):
+    """Return the combined cost of some flows as a single sum.
+
+    >>> total_cost([ScalableFlow("x", unit_cost=2, scale=3), ScalableFlow("y", unit_cost=5, scale=1)])
+    11
+    """
+    # a single Add is flattened once, rather than building an intermediate sum per flow
+    return Add(*(flow.cost for flow in flows))
+
+
 def test_simple_system():
     """The wheels on the bus go round and round."""
     channel_input_rates = {"foo": 12, "bar": 3}
@@ -93,7 +103,7 @@ def test_scaling_system():
     )
 
     verticies = (a1, a2, b1, c1, d1)
-    complete_fulfilment_cost = sum(map((lambda v: v.cost), verticies))
+    complete_fulfilment_cost = total_cost(verticies)
     # cost is 1*2 + 2*3 + 3*5 + 3*7 + 3*11 = 77
     # without integer scaling cost is 1*2 + 1.5*3 + 2.5*5 + 2.5*7 + 2.5*11 = 64
     assert complete_fulfilment_cost == 77
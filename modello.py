@@ -1,12 +1,111 @@
 #!/usr/bin/env python
 """Module for symbolic modeling of systems."""
 import typing
+from functools import lru_cache
 
-from sympy import Basic, Dummy, Eq, solve
+from sympy import Basic, Dummy, Eq, Expr, S, false, linear_eq_to_matrix, linsolve, ordered, solve, sympify, true
+from sympy.core.assumptions import check_assumptions
+from sympy.solvers.solveset import NonlinearError
 # more verbose path as mypy sees sympy.simplify as a module
 from sympy.simplify.simplify import simplify
 
 
+@lru_cache(maxsize=4096)
+def _lru_simplify(expr: Basic) -> Basic:
+    """Return the simplified expression, cached as the same expressions recur across classes and instances."""
+    return simplify(expr)
+
+
+def _cached_simplify(expr: Basic) -> Basic:
+    """Return the simplified expression, using the cache when the expression is hashable."""
+    if getattr(expr, "is_Atom", False):
+        # e.g. dummies and numbers, which are already as simple as they get
+        return expr
+    try:
+        hash(expr)
+    except TypeError:
+        return simplify(expr)
+    return _lru_simplify(expr)
+
+
+@lru_cache(maxsize=4096, typed=True)
+def _lru_sympify(value: typing.Union[int, float, str]) -> Basic:
+    """Return the sympified value, cached as the same literals recur across instances, e.g. in parameter sweeps."""
+    return sympify(value)
+
+
+def _cached_sympify(value: object) -> Basic:
+    """Return the sympified value, using the cache for plain literals."""
+    # typed caching keeps e.g. 1 and 1.0 apart, which containers of them would not
+    if isinstance(value, (int, float, str)):
+        return _lru_sympify(value)
+    return sympify(value)
+
+
+def _xreplace(expr: Basic, rule: typing.Mapping[Basic, Basic]) -> Basic:
+    """Return the expression with the rule applied, without walking atoms such as numbers and dummies."""
+    if expr.is_Atom:
+        return rule.get(expr, expr)
+    return expr.xreplace(rule)
+
+
+def _undefined(value: Basic) -> bool:
+    """Return whether a value is undefined, e.g. from a division by zero, so no dummy can take it."""
+    return value.has(S.NaN, S.ComplexInfinity)
+
+
+def _solve_linear(constraints: typing.List[Eq]) -> typing.Optional[typing.Dict[Basic, Basic]]:
+    """Return the unique solution to linear constraints, or None if they need the general solver."""
+    symbols = list(ordered(set().union(*(constraint.free_symbols for constraint in constraints))))
+    if not symbols:
+        return None
+    try:
+        matrix, vector = linear_eq_to_matrix(constraints, symbols)
+    except NonlinearError:
+        return None
+    solutions = linsolve((matrix, vector), symbols)
+    if len(solutions) != 1:
+        return None
+    (values,) = solutions
+    solution = dict(zip(symbols, values))
+    # anything else (free parameters, values against assumptions) is left to solve
+    if any(value.free_symbols & solution.keys() for value in values) or any(
+        check_assumptions(value, **symbol.assumptions0) is False for symbol, value in solution.items()
+    ):
+        return None
+    return solution
+
+
+def _solve(constraints: typing.List[Eq]) -> typing.List[typing.Dict[Basic, Basic]]:
+    """Return the solutions to the constraints, avoiding the general solver for uniquely solvable linear systems."""
+    if not all(isinstance(constraint, Eq) for constraint in constraints):
+        return solve(constraints, particular=True, dict=True)
+
+    # constraints which only assign constants to distinct dummies are their own solution
+    assignments = {constraint.lhs: constraint.rhs for constraint in constraints}
+    if (
+        len(assignments) == len(constraints)
+        and all(
+            isinstance(symbol, Dummy) and isinstance(value, Expr) and not value.free_symbols
+            for symbol, value in assignments.items()
+        )
+    ):
+        if any(_undefined(value) for value in assignments.values()):
+            return []
+        # infinities are left to the general solver
+        if all(value.is_finite is not False for value in assignments.values()):
+            if all(
+                check_assumptions(value, **symbol.assumptions0) is not False for symbol, value in assignments.items()
+            ):
+                return [assignments]
+            return []
+
+    solution = _solve_linear(constraints)
+    if solution is not None:
+        return [solution]
+    return solve(constraints, particular=True, dict=True)
+
+
 class ModelloSentinelClass:
     """This class is used for quick type.mro() checks."""
 
@@ -14,6 +113,8 @@ class ModelloSentinelClass:
 class InstanceDummy(Dummy):
     """Dummy which will create a bound bummy on Modello instantiation."""
 
+    __slots__ = ()
+
     def bound(self, model_name: str) -> "BoundInstanceDummy":
         """Return a dummy bound to a modello instance."""
         return BoundInstanceDummy(model_name + "_" + self.name, **self.assumptions0)
@@ -27,19 +128,24 @@ class InstanceDummy(Dummy):
 class BoundInstanceDummy(InstanceDummy):
     """Dummy associated with a Modello instance."""
 
+    __slots__ = ()
+
 
 class ModelloMetaNamespace(dict):
     """This is so that Modello class definitions implicitly define symbols."""
 
-    def __init__(self, name: str, bases: typing.Tuple[type, ...]) -> None:
+    def __init__(
+        self, name: str, bases: typing.Tuple[type, ...], simplify_exprs: typing.Optional[bool] = None
+    ) -> None:
         """Create a namespace for a Modello class to use."""
         self.name = name
+        # whether expressions are simplified when the class is created, and values when instances are,
+        # inherited when not given
+        self.simplify = bool(simplify_exprs)
         # map of attributes to sympy Basic (e.g expression, value) objects
         self.attrs: typing.Dict[str, Basic] = {}
         # map of attributes to InstanceDummy instances - metadata used by derived classes
         self.dummies: typing.Dict[str, InstanceDummy] = {}
-        # map of attributes to non-modello managed objects
-        self.other_attrs: typing.Dict[str, object] = {}
         # map of dummies to dummies that override them - metadata used by derived classes
         self.dummy_overrides: typing.Dict[Dummy, Dummy] = {}
 
@@ -52,6 +158,8 @@ class ModelloMetaNamespace(dict):
             #  http://citeseerx.ist.psu.edu/viewdoc/download?doi=10.1.1.19.3910&rep=rep1&type=pdf
 
             if parent_namespace:
+                if simplify_exprs is None:
+                    self.simplify = self.simplify or parent_namespace.simplify
                 # find which dummies are overridden by this base modello
                 for attr in self.dummies.keys() & parent_namespace.dummies.keys():
                     override_dummy = parent_namespace.dummies[attr]
@@ -61,12 +169,15 @@ class ModelloMetaNamespace(dict):
 
                 self.attrs.update(parent_namespace.attrs)
                 self.dummies.update(parent_namespace.dummies)
-                self.other_attrs.update(parent_namespace.other_attrs)
                 self.update(parent_namespace)
-            # substitute overridden dummies in the attributes
-            if self.dummy_overrides:
-                for attr, value in self.attrs.items():
-                    self.attrs[attr] = value.subs(self.dummy_overrides)
+
+        # point each overridden dummy at its final override, so a single xreplace of the attributes is enough
+        for base_dummy, override_dummy in self.dummy_overrides.items():
+            seen = {base_dummy}
+            while override_dummy in self.dummy_overrides and override_dummy not in seen:
+                seen.add(override_dummy)
+                override_dummy = self.dummy_overrides[override_dummy]
+            self.dummy_overrides[base_dummy] = override_dummy
 
     def __setitem__(self, key: str, value: object) -> None:
         """Manage modello attributes as values are assigned."""
@@ -77,7 +188,8 @@ class ModelloMetaNamespace(dict):
                 dummy = value
             else:
                 dummy = InstanceDummy(key, **value.assumptions0)
-            self.attrs[key] = simplify(value).subs(self.dummy_overrides)
+            # simplification and override substitution are done once the class body is complete
+            self.attrs[key] = value
             self.dummies[key] = dummy
             value = dummy
         elif key in self.attrs:
@@ -85,8 +197,6 @@ class ModelloMetaNamespace(dict):
             raise ValueError(
                 "Cannot assign %s.%s to a non-expression" % (self.name, key)
             )
-        else:
-            self.other_attrs[key] = value
         super().__setitem__(key, value)
 
 
@@ -98,24 +208,124 @@ class ModelloMeta(type):
         metacls, __name: str, __bases: typing.Tuple[type, ...], **kwds: typing.Any
     ) -> typing.Mapping[str, typing.Any]:
         """Return a ModelloMetaNamespace instead of a plain dict to accumlate attributes on."""
-        return ModelloMetaNamespace(__name, __bases)
+        return ModelloMetaNamespace(__name, __bases, simplify_exprs=kwds.get("simplify"))
 
     def __new__(
         mcs,
         name: str,
         bases: typing.Tuple[type, ...],
         meta_namespace: ModelloMetaNamespace,
+        **kwds: typing.Any
     ) -> typing.Any:
         """Return a new class with modello attributes."""
+        kwds.pop("simplify", None)
+        # single pass over the completed attributes rather than one per assignment
+        for attr, value in meta_namespace.attrs.items():
+            if meta_namespace.simplify:
+                value = _cached_simplify(value)
+            if meta_namespace.dummy_overrides:
+                value = value.xreplace(meta_namespace.dummy_overrides)
+            meta_namespace.attrs[attr] = value
         namespace = dict(meta_namespace)
         # could follow django's model of _meta? conflicts?
         namespace["_modello_namespace"] = meta_namespace
-        namespace["_modello_class_constraints"] = {
+        namespace["_modello_simplify"] = meta_namespace.simplify
+        # the dummies do not change after class creation, a tuple is quicker to iterate per instance
+        namespace["_modello_dummy_items"] = tuple(meta_namespace.dummies.items())
+        namespace["_modello_class_constraints"] = class_constraints = {
             dummy: meta_namespace.attrs[attr]
             for attr, dummy in meta_namespace.dummies.items()
             if meta_namespace.attrs[attr] is not dummy
         }
-        return super().__new__(mcs, name, bases, namespace)
+        namespace["_modello_class_constraint_items"] = tuple(class_constraints.items())
+        # for the propagation of constants, which only needs to revisit expressions when their symbols become known
+        namespace["_modello_class_constraint_symbols"] = tuple(
+            frozenset(value.free_symbols) for value in class_constraints.values()
+        )
+        return super().__new__(mcs, name, bases, namespace, **kwds)
+
+
+@lru_cache(maxsize=1024)
+def _solve_class(
+    model_cls: typing.Type["Modello"], values: typing.Tuple[typing.Tuple[InstanceDummy, Basic], ...]
+) -> typing.List[typing.Dict[Basic, Basic]]:
+    """Return the solutions for a class given values for some of its dummies, in terms of the class dummies.
+
+    This is cached so instances of a class given the same values only differ by a substitution of their dummies.
+    """
+    constraints = [
+        Eq(class_dummy, value, evaluate=False)
+        for class_dummy, value in model_cls._modello_class_constraint_items + values
+    ]
+
+    # constant values are substituted into the class expressions, and any expressions which become constant are
+    # propagated in turn, so a linear solve only sees the remaining unknowns
+    known = {}
+    pending = []
+    for dummy, value in values:
+        if value.free_symbols:
+            pending.append((dummy, value, value.free_symbols))
+        else:
+            known[dummy] = value
+    if known:
+        # e.g. booleans and tuples are not values a dummy can take, the general solver rejects them
+        if not all(isinstance(value, Expr) for value in known.values()):
+            return _solve(constraints)
+        if any(_undefined(value) for value in known.values()):
+            return []
+        # infinities are left to the general solver, which decides what they mean for the class expressions
+        if any(value.is_finite is False for value in known.values()):
+            return _solve(constraints)
+        if any(check_assumptions(value, **dummy.assumptions0) is False for dummy, value in known.items()):
+            return []
+        pending[:0] = (
+            (class_dummy, value, symbols)
+            for (class_dummy, value), symbols in zip(
+                model_cls._modello_class_constraint_items, model_cls._modello_class_constraint_symbols
+            )
+        )
+        propagated = True
+        while propagated:
+            propagated = False
+            remaining = []
+            for class_dummy, value, symbols in pending:
+                if not symbols.isdisjoint(known):
+                    value = _xreplace(value, known)
+                    symbols = value.free_symbols
+                if class_dummy in known:
+                    # evaluated even with symbols left, as e.g. positive symbols can already rule a value out
+                    constraint = Eq(known[class_dummy], value)
+                    if constraint == false:
+                        return []
+                    if constraint != true:
+                        remaining.append((class_dummy, value, symbols))
+                elif symbols:
+                    remaining.append((class_dummy, value, symbols))
+                else:
+                    if _undefined(value):
+                        return []
+                    if value.is_finite is False:
+                        return _solve(constraints)
+                    if check_assumptions(value, **class_dummy.assumptions0) is False:
+                        return []
+                    known[class_dummy] = value
+                    propagated = True
+            pending = remaining
+        if not pending:
+            return [known]
+        reduced = [
+            Eq(known[class_dummy], value) if class_dummy in known else Eq(class_dummy, value, evaluate=False)
+            for class_dummy, value, _ in pending
+        ]
+        # the linear solver only takes equations, not the booleans of decided ones
+        if any(constraint == false for constraint in reduced):
+            return []
+        reduced = [constraint for constraint in reduced if constraint != true]
+        solution = _solve_linear(reduced)
+        if solution is not None:
+            return [{**known, **solution}]
+    # the general solver picks particular values for underdetermined systems, so it is given the whole system
+    return _solve(constraints)
 
 
 class Modello(ModelloSentinelClass, metaclass=ModelloMeta):
@@ -125,55 +335,94 @@ class Modello(ModelloSentinelClass, metaclass=ModelloMeta):
         "", ()
     )
     _modello_class_constraints: typing.Dict[InstanceDummy, Basic] = {}
+    _modello_class_constraint_items: typing.ClassVar[typing.Tuple[typing.Tuple[InstanceDummy, Basic], ...]] = ()
+    _modello_class_constraint_symbols: typing.ClassVar[typing.Tuple[typing.FrozenSet[Basic], ...]] = ()
+    _modello_dummy_items: typing.ClassVar[typing.Tuple[typing.Tuple[str, InstanceDummy], ...]] = ()
+    # simplify expressions and values, set with e.g. `class Model(Modello, simplify=True)`
+    _modello_simplify: typing.ClassVar[bool] = False
+
+    @staticmethod
+    def clear_caches() -> None:
+        """Clear the caches shared by all Modello classes, e.g. for test isolation."""
+        _lru_sympify.cache_clear()
+        _lru_simplify.cache_clear()
+        _solve_class.cache_clear()
 
     def __init__(self, name: str, **value_map: Basic) -> None:
         """Initialise a model instance and solve for each attribute."""
         instance_dummies = {
             class_dummy: class_dummy.bound(name)
-            for class_dummy in self._modello_namespace.dummies.values()
+            for _, class_dummy in self._modello_dummy_items
         }
         self._modello_instance_dummies = instance_dummies
 
+        # values in terms of the class dummies, used as a key for solutions shared between instances
+        class_values = {}
         instance_constraints = {}
+        class_dummies = self._modello_namespace.dummies
         for attr, value in value_map.items():
-            value = simplify(value).subs(instance_dummies)
+            try:
+                class_dummy = class_dummies[attr]
+            except KeyError:
+                raise AttributeError(
+                    "%r object has no modello attribute %r" % (type(self).__name__, attr)
+                ) from None
+            value = _cached_sympify(value)
+            if self._modello_simplify:
+                value = _cached_simplify(value)
+            class_values[class_dummy] = value
+            value = _xreplace(value, instance_dummies)
             value_map[attr] = value
-            class_dummy = getattr(self, attr)
             instance_dummy = instance_dummies[class_dummy]
             instance_constraints[instance_dummy] = value
         self._modello_instance_constraints: typing.Dict[
             BoundInstanceDummy, Basic
         ] = instance_constraints
 
+        # bound once here and reused for any attributes the solution leaves out
+        bound_class_constraints = {
+            instance_dummies[class_dummy]: _xreplace(value, instance_dummies)
+            for class_dummy, value in self._modello_class_constraint_items
+        }
         constraints = [
-            Eq(instance_dummies[class_dummy], value.subs(instance_dummies))
-            for class_dummy, value in self._modello_class_constraints.items()
+            Eq(instance_dummy, value, evaluate=False)
+            for instance_dummy, value in bound_class_constraints.items()
         ]
         constraints.extend(
-            Eq(instance_dummy, value)
+            Eq(instance_dummy, value, evaluate=False)
             for instance_dummy, value in instance_constraints.items()
         )
         # handy for debugging
         self._modello_constraints: typing.List[Eq] = constraints
 
         if constraints:
-            solutions = solve(constraints, particular=True, dict=True)
+            values = tuple(
+                (class_dummy, class_values[class_dummy])
+                for _, class_dummy in self._modello_dummy_items
+                if class_dummy in class_values
+            )
+            try:
+                hash(values)
+            except TypeError:
+                solutions = _solve(constraints)
+            else:
+                solutions = [
+                    {
+                        _xreplace(symbol, instance_dummies): _xreplace(value, instance_dummies)
+                        for symbol, value in class_solution.items()
+                    }
+                    for class_solution in _solve_class(type(self), values)
+                ]
             if len(solutions) != 1:
                 raise ValueError("%s solutions" % len(solutions))
             solution = solutions[0]
         else:
             solution = {}
 
-        for attr, class_dummy in self._modello_namespace.dummies.items():
+        # values in order of precedence: solution, instance values, class constraints, then the dummy itself
+        resolved = {**bound_class_constraints, **instance_constraints, **solution}
+        # the modello attributes are plain class attributes, so the instance dict can be written directly
+        instance_dict = self.__dict__
+        for attr, class_dummy in self._modello_dummy_items:
             instance_dummy = instance_dummies[class_dummy]
-            if instance_dummy in solution:
-                value = solution[instance_dummy]
-            elif instance_dummy in instance_constraints:
-                value = instance_constraints[instance_dummy]
-            elif class_dummy in self._modello_class_constraints:
-                value = self._modello_class_constraints[class_dummy].subs(
-                    instance_dummies
-                )
-            else:
-                value = instance_dummy
-            setattr(self, attr, value)
+            instance_dict[attr] = resolved.get(instance_dummy, instance_dummy)
@@ -1,6 +1,7 @@
 """Functional tests for Modello instances."""
+import pytest
 from modello import BoundInstanceDummy, InstanceDummy, Modello
-from sympy import simplify
+from sympy import Float, Integer, Rational, ceiling, cos, nan, oo, simplify, sin, zoo
 
 
 def test_no_constraints():
@@ -17,6 +18,22 @@ def test_no_constraints():
     assert isinstance(instance.thing, type(expected))
     assert instance.thing == expected
 
+    assert ExampleClass("Example", thing=oo).thing == oo
+    for value in (nan, zoo):
+        with pytest.raises(ValueError):
+            ExampleClass("Example", thing=value)
+
+
+def test_literal_values_keep_their_type():
+    """Equal literals of different types are not conflated by caching."""
+
+    class ExampleClass(Modello):
+        thing = InstanceDummy("thing")
+
+    assert isinstance(ExampleClass("integer", thing=1).thing, Integer)
+    assert isinstance(ExampleClass("float", thing=1.0).thing, Float)
+    assert ExampleClass("string", thing="1/3").thing == Rational(1, 3)
+
 
 def test_multiple_inheritance_expr_conflict():
     """Overrided modello attributes are replaced with new values."""
@@ -38,3 +55,162 @@ def test_multiple_inheritance_expr_conflict():
 
     assert ExampleC.conflicted == ExampleB.conflicted
     assert ExampleC.conflicted != ExampleA.conflicted
+
+
+def test_multiple_inheritance_override_chain():
+    """Attributes follow a dummy overridden by several bases to its final override."""
+
+    class ExampleA(Modello):
+        conflicted = InstanceDummy("conflicted")
+        a = conflicted + 1
+
+    class ExampleB(Modello):
+        conflicted = InstanceDummy("conflicted")
+
+    class ExampleC(Modello):
+        conflicted = InstanceDummy("conflicted")
+
+    class ExampleD(ExampleA, ExampleB, ExampleC):
+        pass
+
+    assert ExampleD.conflicted == ExampleC.conflicted
+    assert ExampleD._modello_namespace.attrs["a"] == ExampleC.conflicted + 1
+
+    instance = ExampleD("Example", conflicted=2)
+    assert instance.a == 3
+
+
+def test_unknown_attribute():
+    """Values can only be given for modello attributes."""
+
+    class Example(Modello):
+        thing = InstanceDummy("thing")
+
+        def method(self):
+            return self.thing
+
+    with pytest.raises(AttributeError):
+        Example("example", other=1)
+    with pytest.raises(AttributeError):
+        Example("example", method=1)
+
+
+def test_simplify_opt_in():
+    """Class expressions are only simplified when the class asks for it."""
+
+    class Plain(Modello):
+        a = InstanceDummy("a")
+        b = sin(a) ** 2 + cos(a) ** 2
+
+    class Simplified(Modello, simplify=True):
+        a = InstanceDummy("a")
+        b = sin(a) ** 2 + cos(a) ** 2
+
+    class Inherited(Simplified):
+        c = sin(Simplified.a) ** 2 + cos(Simplified.a) ** 2
+
+    assert Plain._modello_namespace.attrs["b"] != 1
+    assert Simplified._modello_namespace.attrs["b"] == 1
+    assert Inherited._modello_namespace.attrs["c"] == 1
+    assert Plain("plain").b == Simplified("simplified").b == 1
+
+    Modello.clear_caches()
+    assert Simplified("simplified", a=1).b == 1
+
+
+def test_linear_constraints():
+    """Linear models are solved in either direction and still respect assumptions."""
+
+    class Sum(Modello):
+        a = InstanceDummy("a")
+        b = InstanceDummy("b", positive=True)
+        c = a + b
+
+    assert Sum("forward", a=1, b=2).c == 3
+    assert Sum("backward", a=1, c=3).b == 2
+    with pytest.raises(ValueError):
+        Sum("negative", a=3, c=1)
+    assert Sum("given", a=1, b=2, c=3).c == 3
+    with pytest.raises(ValueError):
+        Sum("inconsistent", a=1, b=2, c=4)
+
+
+def test_constant_propagation():
+    """Nonlinear expressions of given constants are evaluated through to dependent attributes."""
+
+    class Example(Modello):
+        x = InstanceDummy("x", positive=True)
+        y = ceiling(x)
+        z = y ** 2 + x
+
+    instance = Example("example", x=Rational(3, 2))
+    assert (instance.y, instance.z) == (2, Rational(11, 2))
+    with pytest.raises(ValueError):
+        Example("inconsistent", x=Rational(3, 2), z=5)
+
+    class Shifted(Modello):
+        x = InstanceDummy("x", positive=True)
+        u = InstanceDummy("u")
+        y = x + 1
+        v = u + 1
+
+    with pytest.raises(ValueError):
+        Shifted("negative", y=-1)
+
+
+def test_undefined_propagation():
+    """Substituting constants does not accept values which the class expressions leave undefined."""
+
+    class Reciprocal(Modello):
+        a = InstanceDummy("a")
+        b = 1 / a
+
+    assert Reciprocal("two", a=2).b == Rational(1, 2)
+    for value in (0, oo, nan):
+        with pytest.raises(ValueError):
+            Reciprocal("undefined", a=value)
+
+
+def test_non_expression_values():
+    """Constants which are not expressions, e.g. booleans and tuples, are not solutions."""
+
+    class Example(Modello):
+        a = InstanceDummy("a")
+
+    class Derived(Example):
+        b = Example.a + 1
+
+    for cls in (Example, Derived):
+        for value in (True, (1, 2)):
+            with pytest.raises(TypeError):
+                cls("example", a=value)
+
+
+def test_value_against_assumptions():
+    """Values which contradict a dummy's assumptions have no solution."""
+
+    class Example(Modello):
+        thing = InstanceDummy("thing", positive=True)
+
+    assert Example("Example", thing=2).thing == 2
+    with pytest.raises(ValueError):
+        Example("Example", thing=-2)
+
+
+def test_solutions_shared_between_instances():
+    """Instances given the same values get the same solution in terms of their own dummies."""
+
+    class Example(Modello):
+        a = InstanceDummy("a")
+        b = InstanceDummy("b")
+        c = a * b
+
+    assert Example("first", a=2, c=6).b == Example("second", a=2, c=6).b == 3
+
+    first, second = Example("first"), Example("second")
+    renames = {
+        first._modello_instance_dummies[dummy]: second._modello_instance_dummies[dummy]
+        for dummy in (Example.a, Example.b, Example.c)
+    }
+    assert first.a != second.a
+    assert first.a.xreplace(renames) == second.a